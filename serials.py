@@ -1,12 +1,42 @@
-import subprocess
+import asyncio
 import csv
+import io
+import itertools
 import os
-import json
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
-def run_curl_requests(list_file='ip_list.csv', password_file='password.txt', results_file='results.csv'):
+import aiofiles
+import aiohttp
+import orjson
+
+try:
+    # Optional: lets aiohttp resolve hostnames asynchronously instead of in a thread pool
+    import aiodns
+except ImportError:
+    aiodns = None
+
+# The systeminfo endpoint of the FortiAuthenticator REST API; '{}' is the server address
+SYSTEMINFO_URL = "https://{}/api/v1/systeminfo/?format=json"
+
+# Requests that time out, fail to connect or are rate limited are retried with backoff.
+# Malformed URLs (InvalidURL), TLS errors, 401 and other statuses are not retried. DNS
+# failures count as connection errors and are retried, since they can be temporary.
+MAX_ATTEMPTS = 3
+MAX_RETRY_DELAY = 10
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class ServerListError(Exception):
+    """Raised when the server list cannot be read part way through a run."""
+
+
+def run_curl_requests(list_file='ip_list.csv', password_file='password.txt', results_file='results.csv',
+                      concurrency=20):
     """
     Reads a list of server addresses from `list.csv`, a username and password from `password.txt`,
-    executes a curl command for each server, and writes the results to `results.csv`.
+    queries the systeminfo API of every server concurrently, and writes the results to `results.csv`.
 
     Args:
         list_file (str): The name of the CSV file containing server addresses.
@@ -14,8 +44,14 @@ def run_curl_requests(list_file='ip_list.csv', password_file='password.txt', res
         password_file (str): The name of the text file containing the username on the first line
                              and the password on the second line.
         results_file (str): The name of the CSV file where results will be saved.
+        concurrency (int): The maximum number of API requests in flight at the same time.
     """
 
+    # At least one worker is needed, otherwise nothing would ever be queried
+    if not isinstance(concurrency, int) or concurrency < 1:
+        print(f"Error: concurrency must be a whole number of at least 1, not {concurrency!r}.")
+        return
+
     # --- 1. Read Username and Password from password.txt ---
     username = ""
     password = ""
@@ -34,6 +70,17 @@ def run_curl_requests(list_file='ip_list.csv', password_file='password.txt', res
             if not password:
                 print(f"Error: The second line (password) in '{password_file}' is empty.")
                 return
+
+            # Build the basic auth credentials once. They are only ever sent in the
+            # Authorization header, never placed on a command line. UTF-8 matches
+            # what curl sent; encoding them here reports any problem once, up front.
+            auth = aiohttp.BasicAuth(username, password, encoding='utf-8')
+            auth.encode()
+    except ValueError as e:
+        # Raised by BasicAuth, e.g. when the username contains a ':'
+        # (UnicodeEncodeError is a ValueError too)
+        print(f"Error: Invalid credentials in '{password_file}': {e}")
+        return
     except FileNotFoundError:
         print(f"Error: The password file '{password_file}' was not found in the same directory.")
         print("Please create a file named 'password.txt' with the username on the first line and password on the second.")
@@ -42,17 +89,17 @@ def run_curl_requests(list_file='ip_list.csv', password_file='password.txt', res
         print(f"An unexpected error occurred while reading '{password_file}': {e}")
         return
 
-    # --- 2. Read Server List from ip_list.csv ---
-    server_list = []
+    # --- 2. Open Server List from ip_list.csv ---
+    # The list is read lazily, so the first requests go out while the rest of the
+    # file is still being parsed. Pulling the first address here opens the file,
+    # which surfaces a missing or empty list before any work starts.
     try:
-        with open(list_file, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if row and row[0].strip(): # Ensure row is not empty and first column is not empty
-                    server_list.append(row[0].strip())
-            if not server_list:
-                print(f"Warning: The file '{list_file}' is empty or contains no valid server addresses.")
-                return
+        servers = iter_servers(list_file)
+        first_server = next(servers, None)
+        if first_server is None:
+            print(f"Warning: The file '{list_file}' is empty or contains no valid server addresses.")
+            return
+        servers = itertools.chain([first_server], servers)
     except FileNotFoundError:
         print(f"Error: The server list file '{list_file}' was not found in the same directory.")
         print("Please create a file named 'ip_list.csv' and put your server addresses (one per line) in it.")
@@ -61,96 +108,304 @@ def run_curl_requests(list_file='ip_list.csv', password_file='password.txt', res
         print(f"An unexpected error occurred while reading '{list_file}': {e}")
         return
 
-    # --- 3. Prepare results.csv for writing ---
-    # 'w' mode will create the file if it doesn't exist, or overwrite it if it does.
-    # newline='' is crucial for csv.writer to prevent extra blank rows.
+    # --- 3. Query every server concurrently and write results.csv ---
+    # All requests share a single aiohttp session, so they are issued in parallel
+    # instead of one curl process after another. Each result is written as soon
+    # as it arrives, so rows appear in completion order rather than input order.
     try:
-        with open(results_file, 'w', newline='', encoding='utf-8') as outfile:
-            csv_writer = csv.writer(outfile)
-            # Write the header row to the results CSV
-            csv_writer.writerow(['Server Address', 'Serial Number'])
-
-            # --- 4. Iterate through the server list and execute curl ---
-            for server_address in server_list:
-                # Construct the full URL for the API call
-                url = f"https://{server_address}/api/v1/systeminfo/?format=json"
-
-                # Construct the curl command as a list of strings
-                # -k: --insecure, allows insecure server connections (e.g., self-signed SSL certs)
-                # -s: --silent, suppresses progress meter and error messages (from curl itself)
-                # -S: --show-error, shows error messages even with -s
-                # -u: --user, specifies the user and password for basic authentication
-                curl_command = [
-                    'curl',
-                    '-k',
-                    '-s',
-                    '-S',
-                    '-u', f"{username}:{password}", # Using the username variable here
-                    url
-                ]
-
-                print(f"Attempting to query: {url}...")
-                result_to_write = "" # Initialize variable for the output column
-
-                try:
-                    # Execute the curl command using subprocess.run
-                    # capture_output=True: captures stdout and stderr
-                    # text=True: decodes stdout/stderr as text using default encoding
-                    # check=False: prevents subprocess.run from raising CalledProcessError
-                    #              if the curl command returns a non-zero exit code.
-                    #              We'll handle return codes manually.
-                    process = subprocess.run(
-                        curl_command,
-                        capture_output=True,
-                        text=True,
-                        check=False
-                    )
-
-                    # Get the standard output (where the JSON response should be)
-                    api_response = process.stdout.strip()
-                    # Get the standard error (where curl errors like connection issues will be)
-                    curl_stderr = process.stderr.strip()
-
-                    if process.returncode != 0:
-                        # Curl command itself returned an error (e.g., connection refused, DNS error)
-                        result_to_write = f"CURL ERROR (Exit Code {process.returncode}): {curl_stderr if curl_stderr else 'Unknown curl error or connection issue.'}"
-                        print(f"  FAIL: {result_to_write}")
-                    elif api_response:
-                        # Curl succeeded and returned output.
-                        # Do a basic check to see if it looks like JSON.
-                        if api_response.startswith(("{", "[")) and api_response.endswith(("}", "]")):
-                            result_to_write = api_response # Save the JSON response
-                            print(f"  SUCCESS: JSON response for {server_address} captured.")
-                            json_data = json.loads(api_response)
-                            # Extract 'sn' from the root of the JSON
-                            serial_number = json_data.get('sn', 'SN_NOT_FOUND')
-                            result_to_write = str(serial_number) # Convert to string for CSV
-                            print(f"  SUCCESS: JSON for {server_address} parsed.")
-                        else:
-                            # Unexpected non-JSON output
-                            result_to_write = f"UNEXPECTED RESPONSE: {api_response}"
-                            print(f"  WARNING: Received non-JSON output.")
-                    else:
-                        # No response, but no curl error code
-                        result_to_write = "No API response received (might be empty or timeout)."
-                        print(f"  WARNING: No response from API.")
-
-                except FileNotFoundError:
-                    result_to_write = "ERROR: 'curl' command not found. Please ensure curl is installed and accessible in your system's PATH."
-                    print(f"  CRITICAL ERROR: {result_to_write}")
-                except Exception as e:
-                    result_to_write = f"SCRIPT EXCEPTION: An error occurred during curl execution: {e}"
-                    print(f"  CRITICAL ERROR: {result_to_write}")
-
-                # Write the server address and the determined result to the CSV
-                csv_writer.writerow([server_address, result_to_write])
+        asyncio.run(fetch_all(servers, auth, results_file, concurrency))
 
         print(f"\nAll queries processed. Results saved to '{results_file}'")
 
+    except ServerListError as e:
+        print(f"An unexpected error occurred while reading '{list_file}': {e}")
+        print(f"Results for the servers queried so far were saved to '{results_file}'.")
     except Exception as e:
         print(f"An error occurred while writing to '{results_file}': {e}")
 
 
+def iter_servers(list_file):
+    """
+    Yields the server addresses from the first column of `list_file`, one at a time.
+
+    Args:
+        list_file (str): The name of the CSV file containing server addresses.
+
+    Yields:
+        str: Each non-empty, non-comment server address, stripped of surrounding whitespace. Repeated
+             addresses are only yielded the first time, so each server is queried once.
+    """
+    seen = set()
+    with open(list_file, 'r', encoding='utf-8') as f:
+        # csv.reader pulls one line at a time from the file, so the list is still
+        # streamed, and quoted first columns (e.g. from spreadsheet exports) are unquoted.
+        for row in csv.reader(f):
+            server_address = row[0].strip() if row else ""
+            # Skip empty lines, lines with an empty first column, and '#' comments
+            if not server_address or server_address.startswith('#'):
+                continue
+            if server_address in seen:
+                print(f"Skipping duplicate server address: {server_address}")
+                continue
+            seen.add(server_address)
+            yield server_address
+
+
+async def fetch(session, server_address):
+    """
+    Queries the systeminfo endpoint of a single server and extracts its serial number.
+    Transient failures are retried up to MAX_ATTEMPTS times, see retry_delay().
+
+    Args:
+        session (aiohttp.ClientSession): The shared session used for all requests.
+        server_address (str): The IP address or hostname of the FortiAuthenticator.
+
+    Returns:
+        tuple: (server_address, result_to_write), where result_to_write is either the
+               serial number or a description of the error that occurred.
+    """
+    # Construct the full URL for the API call
+    url = SYSTEMINFO_URL.format(server_address)
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        print(f"Attempting to query: {url}..." + (f" (attempt {attempt} of {MAX_ATTEMPTS})" if attempt > 1 else ""))
+        retry_after = None
+
+        try:
+            async with session.get(url) as resp:
+                if resp.status in RETRY_STATUSES:
+                    # Rate limited or temporarily unavailable; worth trying again
+                    retry_after = resp.headers.get('Retry-After')
+                    result_to_write = f"HTTP ERROR (Status {resp.status}): {resp.reason}"
+                elif resp.status != 200:
+                    # The server answered, but not with the system information. This is
+                    # not retried, e.g. a 401 means the credentials are wrong.
+                    result_to_write = f"HTTP ERROR (Status {resp.status}): {resp.reason}"
+                    print(f"  FAIL ({server_address}): {result_to_write}")
+                    return server_address, result_to_write
+                else:
+                    return server_address, await parse_serial(server_address, resp)
+
+        except asyncio.TimeoutError:
+            result_to_write = "No API response received (request timed out)."
+        except aiohttp.ClientSSLError as e:
+            # TLS or certificate failure; trying again would fail the same way
+            result_to_write = f"CONNECTION ERROR: {e if str(e) else type(e).__name__}"
+            print(f"  FAIL ({server_address}): {result_to_write}")
+            return server_address, result_to_write
+        except aiohttp.ClientConnectionError as e:
+            # Connection refused or reset, DNS error (including unknown hostnames), etc.;
+            # possibly transient
+            result_to_write = f"CONNECTION ERROR: {e if str(e) else type(e).__name__}"
+        except aiohttp.ClientError as e:
+            # Permanent, e.g. an InvalidURL from a malformed entry in the server list
+            result_to_write = f"REQUEST ERROR ({type(e).__name__}): {e}"
+            print(f"  FAIL ({server_address}): {result_to_write}")
+            return server_address, result_to_write
+        except Exception as e:
+            result_to_write = f"SCRIPT EXCEPTION: An error occurred during the API request: {e}"
+            print(f"  CRITICAL ERROR ({server_address}): {result_to_write}")
+            return server_address, result_to_write
+
+        if attempt == MAX_ATTEMPTS:
+            break
+        # Sleep outside the `async with` so the connection is released meanwhile
+        delay = retry_delay(attempt, retry_after)
+        print(f"  RETRY ({server_address}): {result_to_write} Retrying in {delay:.1f}s.")
+        await asyncio.sleep(delay)
+
+    print(f"  FAIL ({server_address}): {result_to_write}")
+    return server_address, result_to_write
+
+
+async def parse_serial(server_address, resp):
+    """
+    Extracts the serial number from a successful systeminfo response.
+
+    Args:
+        server_address (str): The IP address or hostname of the FortiAuthenticator.
+        resp (aiohttp.ClientResponse): The response with status 200.
+
+    Returns:
+        str: The serial number, or a description of why it could not be read.
+    """
+    # Keep the body as raw bytes; orjson parses them directly without first
+    # decoding the whole response to a str.
+    api_response = await resp.read()
+    # isspace() checks the bytes in place, where strip() would copy the whole body
+    if not api_response or api_response.isspace():
+        # Empty body, but the request itself succeeded
+        print(f"  WARNING ({server_address}): No response from API.")
+        return "No API response received (might be empty or timeout)."
+
+    try:
+        json_data = orjson.loads(api_response)
+    except orjson.JSONDecodeError:
+        # Unexpected non-JSON output, whatever Content-Type the server sent
+        print(f"  WARNING ({server_address}): Received non-JSON output.")
+        return f"UNEXPECTED RESPONSE: {api_response.decode('utf-8', 'replace').strip()}"
+
+    if not isinstance(json_data, dict):
+        # Valid JSON, but not the object the systeminfo endpoint returns
+        print(f"  WARNING ({server_address}): Received JSON that is not an object.")
+        return f"UNEXPECTED RESPONSE: {api_response.decode('utf-8', 'replace').strip()}"
+
+    # Extract 'sn' from the root of the JSON
+    serial_number = json_data.get('sn', 'SN_NOT_FOUND')
+    print(f"  SUCCESS: JSON for {server_address} parsed.")
+    return str(serial_number) # Convert to string for CSV
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Works out how long to wait before retrying a failed request.
+
+    Args:
+        attempt (int): The number of the attempt that just failed, starting at 1.
+        retry_after (str): The Retry-After header of the response, if there was one.
+
+    Returns:
+        float: The number of seconds to wait. A Retry-After given as whole seconds or as
+               an HTTP date is honoured (capped at MAX_RETRY_DELAY); otherwise the delay
+               doubles with every attempt, plus up to a second of random jitter.
+    """
+    if retry_after:
+        retry_after = retry_after.strip()
+        # Delta-seconds are a non-negative integer (RFC 9110), so values such as
+        # 'nan', 'inf' or '-1' are ignored instead of reaching asyncio.sleep()
+        if retry_after.isascii() and retry_after.isdigit():
+            delay = int(retry_after)
+        else:
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0.0), MAX_RETRY_DELAY)
+
+    # Jitter keeps workers that failed together from retrying in lockstep
+    return min(2 ** (attempt - 1), MAX_RETRY_DELAY) + random.uniform(0, 1)
+
+
+async def fetch_all(servers, auth, results_file, concurrency=20):
+    """
+    Queries every server in `servers` over a single HTTP session using `concurrency`
+    worker tasks fed from a queue, so at most `concurrency` requests are in flight at
+    any time. A separate writer task appends each result to `results_file` and flushes
+    it as soon as its request completes, so a crash part way through still leaves every
+    finished row on disk.
+
+    Args:
+        servers (iterable): The server addresses to query. May be a lazy iterator.
+        auth (aiohttp.BasicAuth): The credentials sent with every request.
+        results_file (str): The name of the CSV file where results will be saved.
+        concurrency (int): The maximum number of API requests in flight at the same time.
+
+    Raises:
+        ServerListError: If `servers` fails part way through. The servers read before the
+                         failure are still queried and written to `results_file` first.
+    """
+    # A bounded queue keeps only a few addresses read ahead of the workers, and the
+    # fixed number of workers avoids exhausting local ports and flooding the
+    # FortiAuthenticators when the server list is large.
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    # Finished (server address, result) rows waiting to be written to the CSV. This is
+    # bounded too, so a slow disk makes the workers wait instead of piling up rows.
+    results = asyncio.Queue(maxsize=concurrency * 2)
+    # Set if the server list cannot be read part way through
+    list_error = None
+
+    async def produce():
+        nonlocal list_error
+        try:
+            for server_address in servers:
+                await queue.put(server_address)
+        except (OSError, ValueError, csv.Error) as e:
+            # The list is read lazily, so a bad line or I/O error only shows up now.
+            # Stop feeding new servers, but let the queued ones finish and be written.
+            list_error = e
+        # One sentinel per worker tells it there is nothing left to query
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work(session):
+        while True:
+            server_address = await queue.get()
+            if server_address is None:
+                return
+            await results.put(await fetch(session, server_address))
+
+    async def query_all(session):
+        # A TaskGroup cancels the remaining tasks as soon as one of them fails
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            for _ in range(concurrency):
+                tg.create_task(work(session))
+        # Tell the writer that no more rows will arrive
+        await results.put(None)
+
+    async def write_results():
+        # 'w' mode will create the file if it doesn't exist, or overwrite it if it does.
+        # newline='' is crucial for csv.writer to prevent extra blank rows.
+        # buffering=1 (line buffering) flushes each row as part of its write, so every
+        # finished row reaches the OS with a single call.
+        # aiofiles runs the blocking file operations in a thread, so writing never
+        # stalls the requests running on the event loop.
+        async with aiofiles.open(results_file, 'w', newline='', encoding='utf-8', buffering=1) as outfile:
+            # csv.writer formats each row into an in-memory buffer, which takes care of quoting
+            row_buffer = io.StringIO()
+            csv_writer = csv.writer(row_buffer)
+
+            async def write_row(row):
+                csv_writer.writerow(row)
+                await outfile.write(row_buffer.getvalue())
+                row_buffer.seek(0)
+                row_buffer.truncate()
+
+            # Write the header row to the results CSV
+            await write_row(['Server Address', 'Serial Number'])
+
+            while True:
+                row = await results.get()
+                if row is None:
+                    return
+                # Write the server address and the determined result to the CSV
+                await write_row(row)
+
+    # ssl=False: allows insecure server connections (e.g., self-signed SSL certs)
+    # force_close=True: every server is queried once, so keeping its connection open
+    # would only hold a socket per server and run out of file descriptors on large lists.
+    # Resolved hostnames are cached for 5 minutes, so servers that share a hostname
+    # only pay for the DNS lookup once.
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=10,
+        ssl=False,
+        force_close=True,
+        resolver=aiohttp.AsyncResolver() if aiodns else None,
+        use_dns_cache=True,
+        ttl_dns_cache=300
+    )
+    # Credentials and the timeout are attached once to the session rather than
+    # rebuilt for every request.
+    timeout = aiohttp.ClientTimeout(total=15)
+    async with aiohttp.ClientSession(connector=connector, auth=auth, timeout=timeout) as session:
+        # Everything is cancelled before the session closes if any task fails
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(query_all(session))
+                tg.create_task(write_results())
+        except ExceptionGroup as eg:
+            # Re-raise the error that stopped the run, unwrapped from the (nested) groups
+            error = eg
+            while isinstance(error, ExceptionGroup):
+                error = error.exceptions[0]
+            raise error
+
+    if list_error is not None:
+        raise ServerListError(list_error) from list_error
+
+
 # --- How to Run This Script ---
 if __name__ == "__main__":
     # This block will run automatically when you execute the script.